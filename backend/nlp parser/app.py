@@ -1,6 +1,8 @@
 import os
 import re
 import json
+from functools import lru_cache
+from itertools import chain, islice
 from pathlib import Path
 from typing import List, Set, Dict, Tuple, Any, Optional
 
@@ -24,6 +26,10 @@ CANDIDATE_MODEL_DIRS = [
 ML_AVAILABLE = False
 HYBRID_USE_ML = os.getenv("HYBRID_USE_ML", "1") != "0"
 
+# /parse only needs tokens, like_email and entities; set PARSE_FULL_PIPELINE=1 to run every component
+PARSE_FULL_PIPELINE = os.getenv("PARSE_FULL_PIPELINE", "0") == "1"
+PARSE_DISABLED_PIPES: List[str] = ["tagger", "parser", "lemmatizer", "attribute_ruler"]
+
 # Optional patterns directory for EntityRuler JSONL files (e.g., skills.jsonl, titles.jsonl, orgs.jsonl)
 PATTERNS_DIR = Path(os.getenv("PATTERNS_DIR", BASE_DIR / "patterns"))
 
@@ -195,24 +201,27 @@ def normalize_text(text: str) -> str:
     return " " + re.sub(r"[^a-z0-9+.#]+", " ", lowered) + " "
 
 
+# Flat lowercase -> canonical lookup: common variants and known acronyms, with curated aliases taking precedence
+_CANONICAL: Dict[str, str] = {
+    "node": "Node.js",
+    "nodejs": "Node.js",
+    "reactjs": "React",
+    "react.js": "React",
+    "postgres": "PostgreSQL",
+    "aws": "AWS",
+    "gcp": "GCP",
+    "c++": "C++",
+    "c#": "C#",
+    ".net": ".NET",
+    **SKILL_ALIASES,
+}
+
+
+@lru_cache(maxsize=4096)
 def canonical_skill(token: str) -> str:
     t = token.strip()
-    key = t.lower()
-    if key in SKILL_ALIASES:
-        return SKILL_ALIASES[key]
-    # Normalize common variants
-    if key in {"node", "nodejs"}:
-        return "Node.js"
-    if key in {"reactjs", "react.js"}:
-        return "React"
-    if key == "postgres":
-        return "PostgreSQL"
-    # Title-case for typical names, but preserve casing of known acronyms
-    if t.upper() in {"AWS", "GCP"}:
-        return t.upper()
-    if t.lower() in {"c++", "c#", ".net"}:
-        return t
-    return t[:1].upper() + t[1:]
+    # Title-case for typical names
+    return _CANONICAL.get(t.lower()) or t[:1].upper() + t[1:]
 
 
 def extract_email_spacy(doc) -> str:
@@ -222,26 +231,33 @@ def extract_email_spacy(doc) -> str:
     return ""
 
 
+_EMAIL_RE = re.compile(r"[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}")
+
+
 def extract_email_regex(text: str) -> str:
-    m = re.search(r"[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}", text)
+    m = _EMAIL_RE.search(text)
     return m.group(0) if m else ""
 
 
+# Flexible: matches +country, spaces, dashes, parentheses
+_PHONE_RE = re.compile(
+    r"(?:(?:\+?\d{1,3}[\s-]?)?(?:\(?\d{3}\)?[\s-]?)?\d{3}[\s-]?\d{4})"
+)
+_MOBILE_RE = re.compile(r"Mobile[:\s]*(\d{10})", flags=re.IGNORECASE)
+_PHONE_CLEAN_RE = re.compile(r"[^\d+]")
+
+
 def extract_phone_number(text: str) -> str:
-    # Flexible: matches +country, spaces, dashes, parentheses
-    phone_re = re.compile(
-        r"(?:(?:\+?\d{1,3}[\s-]?)?(?:\(?\d{3}\)?[\s-]?)?\d{3}[\s-]?\d{4})"
-    )
-    m = phone_re.search(text)
+    m = _PHONE_RE.search(text)
     if not m:
         # Fallback: Mobile: 10 digits
-        m = re.search(r"Mobile[:\s]*(\d{10})", text, flags=re.IGNORECASE)
+        m = _MOBILE_RE.search(text)
         if m:
             return m.group(1)
         return ""
     # clean: keep digits and leading +
     raw = m.group(0)
-    cleaned = re.sub(r"[^\d+]", "", raw)
+    cleaned = _PHONE_CLEAN_RE.sub("", raw)
     return cleaned
 
 
@@ -252,15 +268,20 @@ def extract_name_ml(doc) -> str:
     return ""
 
 
+_NAME_LINE_RE = re.compile(r"^\s*(?:name)\s*[:\-]\s*(.+)$", flags=re.IGNORECASE)
+_NAME_WORD_RE = re.compile(r"[A-Za-z]+")
+
+
 def extract_name_fallback(text: str) -> str:
     # Try "Name: Jane Doe" style
     for line in text.splitlines()[:10]:
-        m = re.search(r"^\s*(?:name)\s*[:\-]\s*(.+)$", line.strip(), flags=re.IGNORECASE)
+        m = _NAME_LINE_RE.search(line.strip())
         if m:
             return m.group(1).strip()
     # Heuristic: first line with two capitalized words (avoid ALLCAPS / 1-word)
     for line in text.splitlines()[:10]:
-        words = [w for w in re.findall(r"[A-Za-z]+", line)]
+        # only the first two words matter; stop scanning the line after them
+        words = [m.group(0) for m in islice(_NAME_WORD_RE.finditer(line), 2)]
         if len(words) >= 2 and words[0][0].isupper() and words[1][0].isupper():
             candidate = f"{words[0]} {words[1]}"
             if 3 <= len(words[0]) <= 20 and 3 <= len(words[1]) <= 20:
@@ -268,32 +289,68 @@ def extract_name_fallback(text: str) -> str:
     return ""
 
 
-def extract_skills_dict(text: str) -> Set[str]:
-    norm = normalize_text(text)
-    found: Set[str] = set()
-    # direct category keywords
+def build_term_pattern(canon_by_term: Dict[str, Set[str]]) -> Tuple["re.Pattern[str]", Dict[str, Set[str]]]:
+    """
+    Compile lowercase dictionary terms into one alternation so the normalized text is scanned once.
+    Returns (pattern, canonicals_by_term). The scan reports one term per start offset (the longest), so each
+    term's entry also carries the canonicals of shorter terms hit at that offset, e.g. "spring" in "spring boot".
+    """
+    # Longest first so the alternation prefers "spring boot" over "spring"
+    terms = sorted(canon_by_term, key=len, reverse=True)
+    resolved: Dict[str, Set[str]] = {}
+    for term in terms:
+        hits = set(canon_by_term[term])
+        for short in terms:
+            if len(short) < len(term) and re.match(re.escape(short) + r"\b", term):
+                hits |= canon_by_term[short]
+        resolved[term] = hits
+
+    # Zero-width lookahead keeps overlapping hits, e.g. both "node" and "js" in "node.js"
+    pattern = re.compile(r"(?=\b(" + "|".join(re.escape(t) for t in terms) + r")\b)")
+    return pattern, resolved
+
+
+def build_skill_pattern() -> Tuple["re.Pattern[str]", Dict[str, Set[str]]]:
+    """
+    Single-pass pattern over every taxonomy keyword and alias (see build_term_pattern).
+    Canonicals listed in SKILL_STOPWORDS are dropped here, so matches need no post-filtering.
+    """
+    canon_by_term: Dict[str, Set[str]] = {}
     for _cat, keywords in SKILL_TAXONOMY.items():
         for kw in keywords:
-            k = kw.lower()
-            # word-boundary-ish search on normalized text
-            if re.search(rf"\b{re.escape(k)}\b", norm):
-                found.add(canonical_skill(kw))
-    # aliases
+            canon_by_term.setdefault(kw.lower(), set()).add(canonical_skill(kw))
     for alias, canonical in SKILL_ALIASES.items():
-        if re.search(rf"\b{re.escape(alias)}\b", norm):
-            found.add(canonical_skill(canonical))
+        canon_by_term.setdefault(alias, set()).add(canonical_skill(canonical))
+
+    pattern, resolved = build_term_pattern(canon_by_term)
     # filter out noisy words
-    found = {s for s in found if s.lower() not in SKILL_STOPWORDS}
+    return pattern, {t: {h for h in hits if h.lower() not in SKILL_STOPWORDS} for t, hits in resolved.items()}
+
+
+SKILL_PATTERN, SKILL_CANONICALS = build_skill_pattern()
+
+
+def extract_skills_dict(text: str, norm: Optional[str] = None) -> Set[str]:
+    # Callers that already normalized the text can pass it in to skip a full-text substitution
+    if norm is None:
+        norm = normalize_text(text)
+    found: Set[str] = set()
+    # single word-boundary-ish scan over normalized text for keywords and aliases
+    for m in SKILL_PATTERN.finditer(norm):
+        found |= SKILL_CANONICALS[m.group(1)]
     return found
 
 
-def extract_job_titles_dict(text: str) -> Set[str]:
-    norm = normalize_text(text)
+# Same single-pass scan for curated titles; normalize_text makes "Full-Stack Developer" match "full stack developer"
+TITLE_PATTERN, TITLES_BY_TERM = build_term_pattern({title.lower(): {title} for title in JOB_TITLES})
+
+
+def extract_job_titles_dict(text: str, norm: Optional[str] = None) -> Set[str]:
+    if norm is None:
+        norm = normalize_text(text)
     found: Set[str] = set()
-    for title in JOB_TITLES:
-        t = title.lower()
-        if re.search(rf"\b{re.escape(t)}\b", norm):
-            found.add(title)
+    for m in TITLE_PATTERN.finditer(norm):
+        found |= TITLES_BY_TERM[m.group(1)]
     return found
 
 
@@ -306,27 +363,34 @@ def extract_orgs_dict(text: str) -> Set[str]:
     return found
 
 
-def extract_entities_ml(doc) -> Tuple[Set[str], Set[str], Set[str]]:
+def extract_entities_ml(
+    doc, use_ml: bool = True, use_ruler: bool = False
+) -> Tuple[Set[str], Set[str], Set[str], Set[str]]:
+    """
+    Single pass over doc.ents. Returns (ml_skills, ml_titles, ml_orgs, ruler_skills).
+    The EntityRuler runs inside the same pipeline, so its SKILL hits are already on `doc`.
+    """
+    want_skills = use_ml or use_ruler
     skills, titles, orgs = set(), set(), set()
     for ent in getattr(doc, "ents", []):
         if ent.label_ == "SKILL":
-            s = canonical_skill(ent.text)
-            if s.lower() not in SKILL_STOPWORDS:
-                skills.add(s)
+            if want_skills:
+                s = canonical_skill(ent.text)
+                if s.lower() not in SKILL_STOPWORDS:
+                    skills.add(s)
+        elif not use_ml:
+            continue
         elif ent.label_ == "JOB_TITLE":
             titles.add(ent.text)
-        elif ent.label_ in {"ORG", "ORGANIZATION"}:
+        elif ent.label_ in ORG_LABELS:
             orgs.add(ent.text)
-    return skills, titles, orgs
+    # ML and ruler SKILL hits live on the same doc; share one set rather than filling two
+    return skills if use_ml else set(), titles, orgs, skills if use_ruler else set()
 
 
 def merge_sets(*sets: Set[str]) -> List[str]:
-    merged = set()
-    for s in sets:
-        for item in s:
-            merged.add(item.strip())
-    # sort for stable output
-    return sorted(list(merged), key=lambda x: x.lower())
+    # union in C, then strip; sort for stable output
+    return sorted({item.strip() for item in set().union(*sets)}, key=str.lower)
 
 
 # --------------------
@@ -378,24 +442,27 @@ def split_resume_sections(text: str) -> Dict[str, str]:
     if not text:
         return {}
 
-    # Find heading line spans
-    matches = list(HEADING_PATTERN.finditer(text))
-    if not matches:
+    # Find heading line spans lazily
+    matches = HEADING_PATTERN.finditer(text)
+    first = next(matches, None)
+    if first is None:
         # No explicit headings; put everything into 'summary'
         return {"summary": text.strip()}
 
-    # Build list of (start_index_of_content, end_index_of_content, canonical_key)
+    # Walk (heading, next heading) pairs; content spans from one heading to the next
     sections: Dict[str, str] = {}
-    for idx, m in enumerate(matches):
+    m = first
+    for next_m in chain(matches, [None]):
         raw_head = m.group("head").strip().lower()
         canon = CANONICAL_BY_SYNONYM.get(raw_head, raw_head)
         start = m.end()  # content starts after the heading line
-        end = matches[idx + 1].start() if idx + 1 < len(matches) else len(text)
+        end = next_m.start() if next_m is not None else len(text)
         content = text[start:end].strip()
         # Merge duplicate headings of same canonical type
         if content:
             prev = sections.get(canon, "")
             sections[canon] = (prev + "\n\n" + content).strip() if prev else content
+        m = next_m
 
     return sections
 
@@ -403,19 +470,34 @@ def split_resume_sections(text: str) -> Dict[str, str]:
 # --------------------
 # Experience extraction
 # --------------------
+# Year-only first so numeric dates stop before trying the month alternation; months spelled out explicitly
+_DATE_TOKEN = (
+    r"\d{4}|(?:Jan(?:uary)?|Feb(?:ruary)?|Mar(?:ch)?|Apr(?:il)?|May|Jun(?:e)?|Jul(?:y)?|Aug(?:ust)?|"
+    r"Sep(?:t(?:ember)?)?|Oct(?:ober)?|Nov(?:ember)?|Dec(?:ember)?)\s+\d{4}"
+)
 DATE_RANGE_REGEX = re.compile(
-    r"(?P<start>(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Sept|Oct|Nov|Dec)[a-z]*\s+\d{4}|\d{4})\s*"
+    r"(?P<start>" + _DATE_TOKEN + r")\s*"
     r"(?:-|–|—|to|through|until)\s*"
-    r"(?P<end>(?:Present|Current|Now|Till date|Until now|"
-    r"(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Sept|Oct|Nov|Dec)[a-z]*\s+\d{4}|\d{4}))",
+    r"(?P<end>(?:" + _DATE_TOKEN + r"|Present|Current|Now|Till date|Until now))",
     flags=re.IGNORECASE,
 )
 
 
+_BULLET_RE = re.compile(r"^[\-\u2022\u2023\u25E6\u2043\u2219\*]+\s*")
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
 def clean_line(line: str) -> str:
     # Remove bullets and excessive whitespace/delimiters around
-    line = re.sub(r"^[\-\u2022\u2023\u25E6\u2043\u2219\*]+\s*", "", line)
-    return re.sub(r"\s+", " ", line).strip()
+    line = _BULLET_RE.sub("", line)
+    return _WHITESPACE_RE.sub(" ", line).strip()
+
+
+# Connector/label sets shared by the experience patterns. The Matcher hashes these once when patterns are added.
+ORG_LABELS: List[str] = ["ORG", "ORGANIZATION"]
+AT_CONNECTORS: List[str] = ["at", "@", "with", "-", "–", "—"]
+ORG_TITLE_CONNECTORS: List[str] = ["-", "–", "—", "@", "as", ":", ","]
+COMMA_CONNECTORS: List[str] = [",", "-", "–", "—"]
 
 
 def build_experience_matcher(nlp: Language) -> Matcher:
@@ -433,8 +515,8 @@ def build_experience_matcher(nlp: Language) -> Matcher:
         [
             [
                 {"ENT_TYPE": "JOB_TITLE", "OP": "+"},
-                {"LOWER": {"IN": ["at", "@", "with", "-", "–", "—"]}},
-                {"ENT_TYPE": {"IN": ["ORG", "ORGANIZATION"]}, "OP": "+"},
+                {"LOWER": {"IN": AT_CONNECTORS}},
+                {"ENT_TYPE": {"IN": ORG_LABELS}, "OP": "+"},
             ]
         ],
     )
@@ -444,9 +526,9 @@ def build_experience_matcher(nlp: Language) -> Matcher:
         "ORG_TITLE",
         [
             [
-                {"ENT_TYPE": {"IN": ["ORG", "ORGANIZATION"]}, "OP": "+"},
+                {"ENT_TYPE": {"IN": ORG_LABELS}, "OP": "+"},
                 {"IS_PUNCT": True, "OP": "?"},
-                {"LOWER": {"IN": ["-", "–", "—", "@", "as", ":", ","]}, "OP": "?"},
+                {"LOWER": {"IN": ORG_TITLE_CONNECTORS}, "OP": "?"},
                 {"ENT_TYPE": "JOB_TITLE", "OP": "+"},
             ]
         ],
@@ -459,8 +541,8 @@ def build_experience_matcher(nlp: Language) -> Matcher:
             [
                 {"ENT_TYPE": "JOB_TITLE", "OP": "+"},
                 {"IS_PUNCT": True, "OP": "?"},
-                {"LOWER": { "IN": [",", "-", "–", "—"]}, "OP": "?"},
-                {"ENT_TYPE": {"IN": ["ORG", "ORGANIZATION"]}, "OP": "+"},
+                {"LOWER": {"IN": COMMA_CONNECTORS}, "OP": "?"},
+                {"ENT_TYPE": {"IN": ORG_LABELS}, "OP": "+"},
             ]
         ],
     )
@@ -470,6 +552,10 @@ def build_experience_matcher(nlp: Language) -> Matcher:
 
 EXPERIENCE_MATCHER = build_experience_matcher(nlp)
 
+# The experience Matcher only relies on ENT_TYPE / LOWER / IS_PUNCT, so these can be skipped per block
+EXPERIENCE_DISABLED_PIPES: List[str] = ["lemmatizer", "tagger", "parser"]
+EXPERIENCE_BATCH_SIZE = 32
+
 
 def pick_longest(spans: List[spacy.tokens.Span]) -> Optional[str]:
     if not spans:
@@ -525,23 +611,25 @@ def extract_experience(experience_text: str) -> List[Dict[str, str]]:
     if buf:
         blocks.append(" ".join(clean_line(x) for x in buf if x.strip()))
 
-    # Process each block
-    for block in blocks:
-        if not block or len(block) < 5:
-            continue
-
-        doc = nlp(block)
+    # Process each block; batch them through spaCy in one nlp.pipe call
+    blocks = [b for b in blocks if b and len(b) >= 5]
+    # Per-call disable (not select_pipes) so concurrent requests never toggle the shared pipeline
+    docs = nlp.pipe(blocks, batch_size=EXPERIENCE_BATCH_SIZE, disable=EXPERIENCE_DISABLED_PIPES)
 
+    for block, doc in zip(blocks, docs):
         # Run matcher to locate title/org together
         title_text: Optional[str] = None
         org_text: Optional[str] = None
 
-        matches = EXPERIENCE_MATCHER(doc)
+        # Every pattern needs a JOB_TITLE and an ORG entity; skip the Matcher scan when either is absent
+        labels = {ent.label_ for ent in doc.ents}
+        has_pair = "JOB_TITLE" in labels and any(label in labels for label in ORG_LABELS)
+        matches = EXPERIENCE_MATCHER(doc) if has_pair else []
         for _match_id, start, end in matches:
             span = doc[start:end]
             # pull entities from span
             title_spans = [ent for ent in span.ents if ent.label_ == "JOB_TITLE"]
-            org_spans = [ent for ent in span.ents if ent.label_ in {"ORG", "ORGANIZATION"}]
+            org_spans = [ent for ent in span.ents if ent.label_ in ORG_LABELS]
             cand_title = pick_longest(title_spans)
             cand_org = pick_longest(org_spans)
             if cand_title and not title_text:
@@ -557,7 +645,7 @@ def extract_experience(experience_text: str) -> List[Dict[str, str]]:
             title_text = pick_longest(block_titles)
 
         if not org_text:
-            block_orgs = [ent for ent in doc.ents if ent.label_ in {"ORG", "ORGANIZATION"}]
+            block_orgs = [ent for ent in doc.ents if ent.label_ in ORG_LABELS]
             org_text = pick_longest(block_orgs)
 
         # Extra rule fallback: use curated dictionaries if entities missing
@@ -565,11 +653,11 @@ def extract_experience(experience_text: str) -> List[Dict[str, str]]:
             dict_titles = extract_job_titles_dict(block)
             if dict_titles:
                 # pick longest
-                title_text = sorted(dict_titles, key=lambda x: len(x), reverse=True)[0]
+                title_text = max(dict_titles, key=len)
         if not org_text:
             dict_orgs = extract_orgs_dict(block)
             if dict_orgs:
-                org_text = sorted(dict_orgs, key=lambda x: len(x), reverse=True)[0]
+                org_text = max(dict_orgs, key=len)
 
         # Date range
         date_range = detect_date_range(block, doc)
@@ -603,6 +691,8 @@ def extract_experience(experience_text: str) -> List[Dict[str, str]]:
 # --------------------
 app = Flask(__name__)
 
+MAIN_PASS_DISABLED_PIPES: List[str] = [] if PARSE_FULL_PIPELINE else PARSE_DISABLED_PIPES
+
 
 @app.route("/parse", methods=["POST"])
 def parse_resume():
@@ -619,42 +709,30 @@ def parse_resume():
         if not isinstance(text, str) or not text.strip():
             return jsonify({"error": "Invalid request. 'text' field is required."}), 400
 
-        # Always run through spaCy (may be blank). Use ML outputs only if allowed.
-        doc = nlp(text)
-
         # Sectioning
         sections = split_resume_sections(text)
         experience_text = sections.get("experience", "")
 
-        # Structured experience extraction (returns snake_case keys)
-        experiences_struct = extract_experience(experience_text)
+        # Structured experience extraction (returns snake_case keys); blank sections need no spaCy pass
+        experiences_struct = extract_experience(experience_text) if experience_text.strip() else []
 
-        # ML path
-        ml_fullname = extract_name_ml(doc) if (HYBRID_USE_ML and ML_AVAILABLE) else ""
-        ml_skills, ml_titles, ml_orgs = (set(), set(), set())
-        if HYBRID_USE_ML and ML_AVAILABLE:
-            ml_skills, ml_titles, ml_orgs = extract_entities_ml(doc)
+        # Always run through spaCy (may be blank). Use ML outputs only if allowed.
+        doc = nlp(text, disable=MAIN_PASS_DISABLED_PIPES)
 
-        # EntityRuler-based skills from entire text (label SKILL)
-        ruler_skills: Set[str] = set()
-        if ENTITY_RULER is not None:
-            try:
-                # Recompute doc to ensure ruler applied (if not already)
-                doc_r = nlp(text)
-                for ent in getattr(doc_r, "ents", []):
-                    if ent.label_ == "SKILL":
-                        s = canonical_skill(ent.text)
-                        if s.lower() not in SKILL_STOPWORDS:
-                            ruler_skills.add(s)
-            except Exception:
-                pass
+        # ML path + EntityRuler-based skills (label SKILL), collected from the same doc
+        use_ml = HYBRID_USE_ML and ML_AVAILABLE
+        ml_fullname = extract_name_ml(doc) if use_ml else ""
+        ml_skills, ml_titles, ml_orgs, ruler_skills = extract_entities_ml(
+            doc, use_ml=use_ml, use_ruler=ENTITY_RULER is not None
+        )
 
-        # Rule-based path
+        # Rule-based path (text is normalized once and shared by the dictionary scans)
+        norm = normalize_text(text)
         rb_fullname = extract_name_fallback(text)
         rb_email = extract_email_regex(text)
         rb_phone = extract_phone_number(text)
-        rb_skills = extract_skills_dict(text)
-        rb_titles = extract_job_titles_dict(text)
+        rb_skills = extract_skills_dict(text, norm=norm)
+        rb_titles = extract_job_titles_dict(text, norm=norm)
         rb_orgs = extract_orgs_dict(text)
 
         # Email: prefer spaCy token.like_email if present, else regex
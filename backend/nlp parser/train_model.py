@@ -1,46 +1,203 @@
+import glob
+import mmap
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import numpy as np
 import spacy
-from spacy.tokens import DocBin
-import json
-
-# --- 1. LOAD THE BASE MODEL AND TRAINING DATA ---
-# This script is designed to load your training data,
-# which should be in the JSONL format (one JSON object per line).
-nlp = spacy.load("en_core_web_sm")
-
-TRAIN_DATA = []
-try:
-    with open("training_data_clean.jsonl", 'r', encoding='utf-8') as f:
-        for line in f:
-            # We're using json.loads, which is for decoding a string,
-            # as each line is a string containing a JSON object.
-            TRAIN_DATA.append(json.loads(line))
-except FileNotFoundError:
-    # This error handler will now work correctly if you forget to rename the file.
-    print("Error: 'training_data_clean.jsonl' file not found. Please create this file with the training data.")
-    exit()
-
-# --- 2. CONVERT DATA TO SPACY'S BINARY FORMAT ---
-# This converts the list of lists into a DocBin, which
-# is a binary format optimized for spaCy training.
-db = DocBin()
-for entry in TRAIN_DATA:
-    text = entry["text"]
-    annotations = entry["entities"]
-    doc = nlp.make_doc(text)
-    ents = []
-    for start, end, label in annotations:
-        span = doc.char_span(start, end, label=label)
-        if span is None:
-            print(f"Skipping misaligned entity in text: '{text}'")
-        else:
-            ents.append(span)
-    doc.ents = ents
-    db.add(doc)
-db.to_disk("./training.spacy")
-
-print("\nTraining data has been successfully converted to 'training.spacy'.")
-print("Now, please follow these two steps to create the config file and train the model:")
-print("1. Create a config file with the following command:")
-print("\n   python -m spacy init fill-config --lang en --pipeline ner --optimize efficiency --force base_config.cfg\n")
-print("2. Train the model using the config file and the converted data:")
-print("\n   python -m spacy train base_config.cfg --output ./custom_nlp_model --paths.train ./training.spacy --paths.dev ./training.spacy\n")
\ No newline at end of file
+from spacy.tokens import Span
+
+from split_and_prepare import json_loads, new_docbin
+
+# Tokenize in batches rather than one make_doc call per entry.
+BATCH_SIZE = int(os.getenv("TOKENIZER_BATCH_SIZE", "1024"))
+# Entries per worker shard, and how many worker processes convert shards in parallel.
+CHUNK_SIZE = int(os.getenv("DOCBIN_CHUNK_SIZE", "1024"))
+WORKERS = int(os.getenv("DOCBIN_WORKERS", str(os.cpu_count() or 1)))
+# Corpora larger than this are written as a directory of .spacy shards; the parent only holds the current shard
+# plus a bounded window of converted chunks, never the full DocBin.
+SHARD_DOCS = int(os.getenv("DOCBIN_SHARD_DOCS", "10000"))
+# Every DEV_EVERY-th entry is held out for the dev set.
+DEV_EVERY = 10
+
+
+def intern_entities(entities, label_vocab):
+    """
+    Turn a list of [start, end, label] annotations into three column arrays
+    (starts:int32, ends:int32, label_ids:int8), assigning new labels the next id in label_vocab.
+    """
+    n = len(entities)
+    starts = np.fromiter((e[0] for e in entities), dtype=np.int32, count=n)
+    ends = np.fromiter((e[1] for e in entities), dtype=np.int32, count=n)
+    label_ids = [label_vocab.setdefault(e[2], len(label_vocab)) for e in entities]
+    # ids run 0..len-1, so up to iinfo.max + 1 labels fit
+    if len(label_vocab) > np.iinfo(np.int8).max + 1:
+        raise ValueError(f"Too many entity labels ({len(label_vocab)}) for int8 label ids")
+    return starts, ends, np.array(label_ids, dtype=np.int8)
+
+
+def aligned_spans(doc, annotations, label_names):
+    """
+    Map (starts, ends, label_ids) annotation columns onto token boundaries with one vectorized lookup per doc.
+    Same strict alignment as doc.char_span: both offsets must fall exactly on token boundaries.
+    Returns (spans, skipped).
+    """
+    ann_starts, ann_ends, label_ids = annotations
+    if not len(ann_starts):
+        return [], 0
+    if len(doc) == 0:
+        return [], len(ann_starts)
+    starts = np.fromiter((t.idx for t in doc), dtype=np.int64, count=len(doc))
+    ends = starts + np.fromiter((len(t) for t in doc), dtype=np.int64, count=len(doc))
+
+    last = len(doc) - 1
+    i_idx = np.minimum(np.searchsorted(starts, ann_starts), last)
+    j_idx = np.minimum(np.searchsorted(ends, ann_ends), last)
+    ok = (starts[i_idx] == ann_starts) & (ends[j_idx] == ann_ends) & (i_idx <= j_idx)
+
+    spans = [
+        Span(doc, int(i), int(j) + 1, label=label_names[label_id])
+        for i, j, label_id in zip(i_idx[ok], j_idx[ok], label_ids[ok])
+    ]
+    return spans, len(ann_starts) - len(spans)
+
+
+def convert_chunk(entries, label_names):
+    """
+    Convert one shard of training entries into a serialized DocBin (runs in a worker process).
+    label_names maps the interned label ids on each entry back to label strings.
+    Returns (docbin_bytes, skipped) where skipped counts misaligned entities.
+    """
+    # Only the tokenizer is needed to build the DocBin, so a blank English pipeline is enough.
+    nlp = spacy.blank("en")
+    texts = [entry["text"] for entry in entries]
+    annots = [entry["entities"] for entry in entries]
+
+    db = new_docbin()
+    skipped = 0
+    for annotations, doc in zip(annots, nlp.tokenizer.pipe(texts, batch_size=BATCH_SIZE)):
+        # Misaligned entities are counted and reported once after conversion, not printed per entity
+        ents, doc_skipped = aligned_spans(doc, annotations, label_names)
+        skipped += doc_skipped
+        doc.ents = ents
+        db.add(doc)
+    return db.to_bytes(), skipped
+
+
+def write_shards(shards, train_path, sharded):
+    """
+    Merge worker shards (in order) and write them out. When `sharded`, every SHARD_DOCS docs are flushed to
+    train_path/training-<k>.spacy and the in-memory DocBin is reset; otherwise a single file is written.
+    Returns the total number of skipped entities.
+    """
+    db = new_docbin()
+    skipped = 0
+    k = 0
+    for shard, shard_skipped in shards:
+        db.merge(new_docbin().from_bytes(shard))
+        skipped += shard_skipped
+        if sharded and len(db) >= SHARD_DOCS:
+            db.to_disk(os.path.join(train_path, f"training-{k}.spacy"))
+            k += 1
+            db = new_docbin()
+    if not sharded:
+        db.to_disk(train_path)
+    elif len(db):
+        db.to_disk(os.path.join(train_path, f"training-{k}.spacy"))
+    return skipped
+
+
+def ordered_results(pool, fn, items, window):
+    """
+    Like pool.map(fn, items), but with at most `window` chunks in flight, so finished results cannot
+    pile up in the parent behind one slow early chunk. Yields results in submission order.
+    """
+    pending = deque()
+    for item in items:
+        if len(pending) >= window:
+            yield pending.popleft().result()
+        pending.append(pool.submit(fn, item))
+    while pending:
+        yield pending.popleft().result()
+
+
+def convert_entries(entries, label_names, out_path, sharded):
+    """Convert entries to DocBin(s) at out_path, in parallel worker processes when there is more than one chunk."""
+    chunks = [entries[i:i + CHUNK_SIZE] for i in range(0, len(entries), CHUNK_SIZE)]
+    convert = partial(convert_chunk, label_names=label_names)
+    if len(chunks) > 1 and WORKERS > 1:
+        workers = min(WORKERS, len(chunks))
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            return write_shards(ordered_results(pool, convert, chunks, 2 * workers), out_path, sharded)
+    # Not worth starting worker processes for a single shard
+    return write_shards((convert(chunk) for chunk in chunks), out_path, sharded)
+
+
+if __name__ == "__main__":
+    # --- 1. LOAD THE TRAINING DATA ---
+    # This script is designed to load your training data,
+    # which should be in the JSONL format (one JSON object per line).
+    TRAIN_DATA = []
+    # Entity labels are interned to small int ids at load time; label_names[id] gives the string back.
+    label_vocab = {}
+    try:
+        # Memory-map the file and hand each line's bytes to the decoder; nothing reads the whole file into RAM.
+        with open("training_data_clean.jsonl", 'rb') as f:
+            # mmap cannot map an empty file
+            if os.fstat(f.fileno()).st_size:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    i, size = 0, len(mm)
+                    while i < size:
+                        j = mm.find(b"\n", i)
+                        if j == -1:
+                            j = size
+                        line = mm[i:j]
+                        # Each line holds one JSON object; skip blank lines.
+                        if line.strip():
+                            entry = json_loads(line)
+                            entry["entities"] = intern_entities(entry["entities"], label_vocab)
+                            TRAIN_DATA.append(entry)
+                        i = j + 1
+    except FileNotFoundError:
+        # This error handler will now work correctly if you forget to rename the file.
+        print("Error: 'training_data_clean.jsonl' file not found. Please create this file with the training data.")
+        exit()
+
+    # --- 2. CONVERT DATA TO SPACY'S BINARY FORMAT ---
+    # This converts the list of lists into a DocBin, which
+    # is a binary format optimized for spaCy training.
+    # Every 10th entry goes to a held-out dev set so training does not evaluate on (and load twice) its own data.
+    dev_entries = TRAIN_DATA[DEV_EVERY - 1::DEV_EVERY]
+    train_entries = [entry for k, entry in enumerate(TRAIN_DATA, 1) if k % DEV_EVERY]
+    dev_path = "./dev.spacy"
+
+    # Shards are converted in parallel worker processes and merged back in order.
+    # spaCy's corpus reader accepts either a single .spacy file or a directory of them.
+    sharded = len(train_entries) > SHARD_DOCS
+    train_path = "./training" if sharded else "./training.spacy"
+    if sharded:
+        os.makedirs(train_path, exist_ok=True)
+        # spaCy reads every .spacy file in the directory, so shards left by an earlier, larger run must go
+        for stale in glob.glob(os.path.join(train_path, "training-*.spacy")):
+            os.remove(stale)
+
+    label_names = sorted(label_vocab, key=label_vocab.get)
+    skipped = convert_entries(train_entries, label_names, train_path, sharded)
+    skipped += convert_entries(dev_entries, label_names, dev_path, sharded=False)
+
+    if skipped:
+        print(f"Skipped {skipped} misaligned entities")
+
+    print(f"\nTraining data has been successfully converted to '{train_path}' ({len(train_entries)} docs) "
+          f"and '{dev_path}' ({len(dev_entries)} docs).")
+    print("Now, please follow these two steps to create the config file and train the model:")
+    print("1. Create a config file with the following command:")
+    print("\n   python -m spacy init fill-config --lang en --pipeline ner --optimize efficiency --force base_config.cfg\n")
+    print("2. Train the model using the config file and the converted data (docs are already tokenized in the DocBin):")
+    print(f"\n   python -m spacy train base_config.cfg --output ./custom_nlp_model --paths.train {train_path} --paths.dev {dev_path} --gpu-id 0\n")
+    print("   Drop '--gpu-id 0' to train on CPU (GPU training needs spacy[cuda] / cupy installed).")
+    if sharded:
+        print(f"   Note: config.cfg's [paths] train still defaults to ./training.spacy; keep --paths.train {train_path} "
+              "or update the config.")